@@ -1,15 +1,66 @@
 #!/usr/bin/env python3
 import os
-import json
 from datetime import datetime, timezone
-from github import Auth, Github, GithubException, Repository
+from functools import lru_cache
+from github import Auth, Github, GithubException
 import sys
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+ALERTS_QUERY = """
+query($owner: String!, $name: String!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    vulnerabilityAlerts(first: 100, states: OPEN, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        number
+        createdAt
+        vulnerableManifestPath
+        securityVulnerability { severity package { name } }
+        securityAdvisory { ghsaId summary }
+      }
+    }
+  }
+}
+"""
+
+COMMENT_HEADER = "## Dependabot Alert Summary"
+
+ALL_CLEAR_OUTPUT = (
+    f"{COMMENT_HEADER}\n"
+    "Total open alerts: 0\n"
+    "Alerts exceeding age threshold: 0\n"
+    "\n:white_check_mark: All alerts are within acceptable age thresholds"
+)
+
+VIOLATION_TEMPLATE = (
+    "\n\n#### \n"
+    "- **Severity:** {severity}\n"
+    "- **Age:** {age_days} days (Threshold: {threshold_days} days)\n"
+    "- **Created:** {created_at}\n"
+    "- **URL:** {url}\n"
+    "- **Manifests:**"
+)
+
+# GraphQL reports medium severity as MODERATE
+SEVERITY_ALIASES = {"MODERATE": "MEDIUM"}
+
+
+@lru_cache(maxsize=1)
+def _load_event(event_path):
+    # The event file does not change during a workflow run. Errors are
+    # raised rather than returned so that a failed read is not cached.
+    with open(event_path, "rb") as f:
+        return json_loads(f.read())
+
 
 def read_event_file(event_path):
     try:
-        with open(event_path) as f:
-            return json.load(f)
+        return _load_event(event_path)
     except Exception as e:
         print(f"Error reading event file: {e}")
         return {}
@@ -40,9 +91,10 @@ def get_pr_number(repo, event_name, event):
 def create_or_update_pr_comment(repo, pr_number, body):
     try:
         pr = repo.get_pull(pr_number)
-        # Look for existing bot comment
+        # Look for existing bot comment. It is created on the first run, so
+        # scanning oldest first usually finds it on the first page.
         for comment in pr.get_issue_comments():
-            if "## Dependabot Alert Summary" in comment.body:
+            if comment.body.startswith(COMMENT_HEADER):
                 print("Updating existing comment")
                 comment.edit(body)
                 return
@@ -57,8 +109,13 @@ def create_or_update_pr_comment(repo, pr_number, body):
         return
 
 
-def get_alert_age(created_at):
-    now = datetime.now(timezone.utc)
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def get_alert_age(created_at, now=None):
+    if now is None:
+        now = _now()
     age = now - created_at
     return age.days
 
@@ -89,15 +146,24 @@ def get_github_repo(github: Github):
 
 def get_dependabot_alerts(repo):
     try:
-        alerts = repo.get_dependabot_alerts(state="open")
-        alerts_list = list(alerts)
-        print(f"Returned {len(alerts_list)} alerts")
+        alerts = []
+        owner, name = repo.full_name.split("/")
+        variables = {"owner": owner, "name": name, "after": None}
+        while True:
+            _, data = repo.requester.graphql_query(ALERTS_QUERY, variables)
+            page = data["data"]["repository"]["vulnerabilityAlerts"]
+            alerts.extend(page["nodes"])
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            variables["after"] = page["pageInfo"]["endCursor"]
+        for alert in alerts:
+            alert["url"] = f"{repo.html_url}/security/dependabot/{alert['number']}"
+        print(f"Returned {len(alerts)} alerts")
         return alerts
     except GithubException as e:
-        if e.status == 403 and e.data.get('message', '') == "Dependabot alerts are disabled for this repository.":
-            return []
         print(f"Error: {e}")
-        if e.status == 403:
+        errors = e.data.get("errors", []) if isinstance(e.data, dict) else []
+        if e.status == 403 or any(error.get("type") == "FORBIDDEN" for error in errors):
             print("Error: Insufficient permissions to access Dependabot alerts")
             print("Please ensure:")
             print("1. GITHUB_TOKEN has 'security_events' permission")
@@ -112,50 +178,64 @@ def get_dependabot_alerts(repo):
 
 def analyze_alerts(alerts, ALERT_THRESHOLDS):
     violations = []
-    all_alerts = []
+    # One violation per advisory and package, however many manifests it affects
+    violations_by_advisory = {}
+    now = _now()
+    # Resolve each GraphQL severity to its reported name and threshold once
+    severities = {severity: (severity, threshold) for severity, threshold in ALERT_THRESHOLDS.items()}
+    for alias, severity in SEVERITY_ALIASES.items():
+        severities[alias] = severities[severity]
+
     for alert in alerts:
-        if not alert.state == "open":
+        vulnerability = alert["securityVulnerability"]
+        severity, threshold = severities[vulnerability["severity"]]
+        created_at = datetime.fromisoformat(alert["createdAt"])
+        age = get_alert_age(created_at, now)
+
+        # Only violations are reported individually, the rest are just counted
+        if age <= threshold:
             continue
 
-        severity = alert.security_advisory.severity.upper()
-        age = get_alert_age(alert.created_at)
-        threshold = ALERT_THRESHOLDS.get(severity)
-        dependency = alert.dependency
-        package = dependency.package
+        package = vulnerability["package"]["name"]
+        advisory = alert["securityAdvisory"]
+        violation = violations_by_advisory.get((advisory["ghsaId"], package))
+        if violation is None:
+            violation = {"package": package, "title": advisory["summary"], "manifests": []}
+            violations_by_advisory[(advisory["ghsaId"], package)] = violation
+            violations.append(violation)
+        violation["manifests"].append(alert["vulnerableManifestPath"])
 
-        alert_info = {
-            "package": package.name,
-            "severity": severity,
-            "age_days": age,
-            "threshold_days": threshold,
-            "url": alert.html_url,
-            "title": alert.security_advisory.summary,
-            "created_at": alert.created_at.strftime("%Y-%m-%d %H:%M:%S UTC"),
-        }
+        # Report the oldest alert for the advisory
+        if "age_days" not in violation or age > violation["age_days"]:
+            violation.update({
+                "severity": severity,
+                "age_days": age,
+                "threshold_days": threshold,
+                "url": alert["url"],
+                # GitHub timestamps are always UTC
+                "created_at": created_at.isoformat(sep=" ", timespec="seconds").replace("+00:00", " UTC"),
+            })
 
-        all_alerts.append(alert_info)
+    return violations, len(alerts)
 
-        if age > threshold:
-            violations.append(alert_info)
-    return violations, all_alerts
 
+def format_alert_output(violations, alert_count, REPORT_MODE):
+    if not alert_count:
+        return ALL_CLEAR_OUTPUT
+
+    # Each manifest listed against a violation is a separate alert
+    violation_count = sum(len(violation["manifests"]) for violation in violations)
 
-def format_alert_output(violations, all_alerts, REPORT_MODE):
     output = []
-    output.append("## Dependabot Alert Summary")
-    output.append(f"Total open alerts: {len(all_alerts)}")
-    output.append(f"Alerts exceeding age threshold: {len(violations)}")
+    output.append(COMMENT_HEADER)
+    output.append(f"Total open alerts: {alert_count}")
+    output.append(f"Alerts exceeding age threshold: {violation_count}")
 
     if violations:
         output.append("\n### :x: Violations (Alerts exceeding threshold)")
         for violation in violations:
-            output.append(f"\n\n#### ")
-            output.append(f"- **Severity:** {violation['severity']}")
-            output.append(
-                f"- **Age:** {violation['age_days']} days (Threshold: {violation['threshold_days']} days)"
-            )
-            output.append(f"- **Created:** {violation['created_at']}")
-            output.append(f"- **URL:** {violation['url']}")
+            output.append(VIOLATION_TEMPLATE.format_map(violation))
+            output.extend(f"  - {manifest}" for manifest in violation["manifests"])
 
         if REPORT_MODE:
             output.append(
@@ -205,8 +285,8 @@ def main_check_alerts(
     github, repo, alert_thresholds, report_mode, event_name, event_path
 ):
     alerts = get_dependabot_alerts(repo)
-    violations, all_alerts = analyze_alerts(alerts, alert_thresholds)
-    output = format_alert_output(violations, all_alerts, report_mode)
+    violations, alert_count = analyze_alerts(alerts, alert_thresholds)
+    output = format_alert_output(violations, alert_count, report_mode)
 
     event = read_event_file(event_path)
     pr_number = get_pr_number(repo, event_name, event)
@@ -225,7 +305,7 @@ if __name__ == "__main__":
     installation_id = get_env_variable("INSTALLATION_ID")
 
     auth = Auth.AppAuth(app_id, private_key).get_installation_auth(int(installation_id))
-    github = Github(auth=auth)
+    github = Github(auth=auth, per_page=100)
 
     repo = get_github_repo(github)
 
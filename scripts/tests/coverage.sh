@@ -19,6 +19,6 @@ cd "$(git rev-parse --show-toplevel)"
 
 python -m pip install --upgrade pip
 pip install -r test-requirements.txt
-coverage run --omit='*/test_*.py' -m unittest discover
-coverage report -m
+coverage run -m unittest discover
+coverage report
 coverage xml
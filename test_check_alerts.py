@@ -1,11 +1,13 @@
 import unittest
 import os
-import json
+from contextlib import ExitStack
 from unittest.mock import MagicMock, patch, mock_open, Mock
 from github import GithubException
 from datetime import datetime, timezone, timedelta
 
 from check_alerts import (
+    ALERTS_QUERY,
+    _load_event,
     read_event_file,
     get_pr_number,
     create_or_update_pr_comment,
@@ -21,54 +23,32 @@ from check_alerts import (
     main_check_alerts,
 )
 
+NOW = datetime(2025, 2, 10, 12, 0, tzinfo=timezone.utc)
+
+# name, event_name, event, open PRs for the pushed branch, expected PR number
+GET_PR_NUMBER_CASES = [
+    ("pull_request", "pull_request", {"pull_request": {"number": 123}}, [], 123),
+    ("push", "push", {"ref": "refs/heads/test_branch"}, [Mock(number=456)], 456),
+    ("not_a_pull_request", "push", {"ref": "refs/heads/test_branch"}, [], None),
+    ("missing_pull_request_event", "push", {}, [], None),
+    ("missing_pull_request_key", "push", {"pull_request": {}}, [], None),
+]
+
 class TestGetPrNumber(unittest.TestCase):
     def setUp(self):
         self.repo = Mock()
         self.repo.owner.login = "test_owner"
 
-    def test_get_pr_number_pull_request(self):
-        event_name = "pull_request"
-        event = {
-            "pull_request": {
-                "number": 123
-            }
-        }
-        pr_number = get_pr_number(self.repo, event_name, event)
-        self.assertEqual(pr_number, 123)
-
-    def test_get_pr_number_push(self):
-        event_name = "push"
-        event = {
-            "ref": "refs/heads/test_branch"
-        }
-        self.repo.get_pulls.return_value = [Mock(number=456)]
-        pr_number = get_pr_number(self.repo, event_name, event)
-        self.assertEqual(pr_number, 456)
-
-    def test_get_pr_number_not_a_pull_request(self):
-        event_name = "push"
-        event = {
-            "ref": "refs/heads/test_branch"
-        }
-        self.repo.get_pulls.return_value = []
-        pr_number = get_pr_number(self.repo, event_name, event)
-        self.assertIsNone(pr_number)
-
-    def test_get_pr_number_missing_pull_request_event(self):
-        event_name = "push"
-        event = {}
-        self.repo.get_pulls.return_value = []
-        pr_number = get_pr_number(self.repo, event_name, event)
-        self.assertIsNone(pr_number)
-
-    def test_get_pr_number_missing_pull_request_key(self):
-        event_name = "push"
-        event = {"pull_request": {}}
-        self.repo.get_pulls.return_value = []
-        pr_number = get_pr_number(self.repo, event_name, event)
-        self.assertIsNone(pr_number)
+    def test_get_pr_number_cases(self):
+        for name, event_name, event, open_pulls, expected in GET_PR_NUMBER_CASES:
+            with self.subTest(name=name):
+                self.repo.get_pulls.return_value = open_pulls
+                self.assertEqual(get_pr_number(self.repo, event_name, event), expected)
 
 class TestReadEventFile(unittest.TestCase):
+    def setUp(self):
+        _load_event.cache_clear()
+
     def test_read_event_file_success(self):
         mock_data = '{"key": "value"}'
         with patch("builtins.open", mock_open(read_data=mock_data)):
@@ -80,51 +60,70 @@ class TestReadEventFile(unittest.TestCase):
             result = read_event_file("dummy_path")
             self.assertEqual(result, {})
 
+    def test_read_event_file_cached(self):
+        mock_data = '{"key": "value"}'
+        with patch("builtins.open", mock_open(read_data=mock_data)) as mock_file:
+            read_event_file("dummy_path")
+            result = read_event_file("dummy_path")
+            self.assertEqual(result, {"key": "value"})
+            mock_file.assert_called_once_with("dummy_path", "rb")
+
+    def test_read_event_file_failure_not_cached(self):
+        with patch("builtins.open", side_effect=Exception("File not found")):
+            read_event_file("dummy_path")
+        with patch("builtins.open", mock_open(read_data='{"key": "value"}')):
+            result = read_event_file("dummy_path")
+            self.assertEqual(result, {"key": "value"})
+
+
+def make_pr_comment_mocks(comment_body="## Dependabot Alert Summary - Existing Comment"):
+    mock_repo = Mock()
+    mock_pr = Mock()
+    mock_comment = Mock()
+    mock_comment.body = comment_body
+    mock_pr.get_issue_comments.return_value = [mock_comment]
+    mock_repo.get_pull.return_value = mock_pr
+    return mock_repo, mock_pr, mock_comment
 
 class TestCreateOrUpdatePRComment(unittest.TestCase):
 
-    @patch("check_alerts.Github")
-    def test_update_existing_comment(self, mock_github):
-        mock_repo = Mock()
-        mock_pr = Mock()
-        mock_comment = Mock()
-        mock_comment.body = "## Dependabot Alert Summary - Existing Comment"
-        mock_pr.get_issue_comments.return_value = [mock_comment]
-        mock_repo.get_pull.return_value = mock_pr
-        mock_github.return_value.get_repo.return_value = mock_repo
+    def test_update_existing_comment(self):
+        mock_repo, mock_pr, mock_comment = make_pr_comment_mocks()
 
         create_or_update_pr_comment(mock_repo, 1, "New Comment Body")
 
         mock_comment.edit.assert_called_once_with("New Comment Body")
         mock_pr.create_issue_comment.assert_not_called()
 
-    @patch("check_alerts.Github")
-    def test_create_new_comment(self, mock_github):
-        mock_repo = Mock()
-        mock_pr = Mock()
+    def test_ignores_comment_quoting_summary(self):
+        mock_repo, mock_pr, mock_comment = make_pr_comment_mocks(
+            "> ## Dependabot Alert Summary\nWhy is this failing?"
+        )
+
+        create_or_update_pr_comment(mock_repo, 1, "New Comment Body")
+
+        mock_comment.edit.assert_not_called()
+        mock_pr.create_issue_comment.assert_called_once_with("New Comment Body")
+
+    def test_create_new_comment(self):
+        mock_repo, mock_pr, _ = make_pr_comment_mocks()
         mock_pr.get_issue_comments.return_value = []
-        mock_repo.get_pull.return_value = mock_pr
-        mock_github.return_value.get_repo.return_value = mock_repo
 
         create_or_update_pr_comment(mock_repo, 1, "New Comment Body")
 
         mock_pr.create_issue_comment.assert_called_once_with("New Comment Body")
 
-    @patch("check_alerts.Github")
-    def test_github_exception(self, mock_github):
-        mock_repo = Mock()
+    def test_github_exception(self):
+        mock_repo, _, _ = make_pr_comment_mocks()
         mock_repo.get_pull.side_effect = GithubException(403, "Error")
-        mock_github.return_value.get_repo.return_value = mock_repo
 
         create_or_update_pr_comment(mock_repo, 1, "New Comment Body")
 
         # If we reached here the function handled the GithubException correctly by not raising it again
 
-    @patch("check_alerts.Github")
-    def test_other_exception(self, mock_github):
-        mock_repo = Mock()
+    def test_other_exception(self):
+        mock_repo, _, _ = make_pr_comment_mocks()
         mock_repo.get_pull.side_effect = Exception("Other Error")
-        mock_github.return_value.get_repo.return_value = mock_repo
 
         create_or_update_pr_comment(mock_repo, 1, "New Comment Body")
 
@@ -132,20 +131,26 @@ class TestCreateOrUpdatePRComment(unittest.TestCase):
 class TestGetAlertAge(unittest.TestCase):
 
     def test_get_alert_age_recent(self):
-        created_at = datetime.now(timezone.utc) - timedelta(days=2)
-        self.assertEqual(get_alert_age(created_at), 2)
+        created_at = NOW - timedelta(days=2)
+        self.assertEqual(get_alert_age(created_at, now=NOW), 2)
 
     def test_get_alert_age_old(self):
-        created_at = datetime.now(timezone.utc) - timedelta(days=35)
-        self.assertEqual(get_alert_age(created_at), 35)
+        created_at = NOW - timedelta(days=35)
+        self.assertEqual(get_alert_age(created_at, now=NOW), 35)
 
     def test_get_alert_age_same_day(self):
-        created_at = datetime.now(timezone.utc) - timedelta(hours=5)
-        self.assertEqual(get_alert_age(created_at), 0)
+        created_at = NOW - timedelta(hours=5)
+        self.assertEqual(get_alert_age(created_at, now=NOW), 0)
 
     def test_get_alert_age_future(self):
-        created_at = datetime.now(timezone.utc) + timedelta(days=1)
-        self.assertEqual(get_alert_age(created_at), -1)
+        created_at = NOW + timedelta(days=1)
+        self.assertEqual(get_alert_age(created_at, now=NOW), -1)
+
+    @patch("check_alerts._now", return_value=NOW)
+    def test_get_alert_age_defaults_to_current_time(self, mock_now):
+        created_at = NOW - timedelta(days=9)
+        self.assertEqual(get_alert_age(created_at), 9)
+        mock_now.assert_called_once_with()
 
 
 class TestGetThresholdsFromEnv(unittest.TestCase):
@@ -163,7 +168,7 @@ class TestGetThresholdsFromEnv(unittest.TestCase):
         expected_thresholds = {"CRITICAL": 1, "HIGH": 2, "MEDIUM": 7, "LOW": 15}
         self.assertEqual(get_thresholds_from_env(), expected_thresholds)
 
-    @patch.dict(os.environ, {})
+    @patch.dict(os.environ, {}, clear=True)
     def test_get_thresholds_from_env_default(self):
         expected_thresholds = {"CRITICAL": 3, "HIGH": 5, "MEDIUM": 14, "LOW": 30}
         self.assertEqual(get_thresholds_from_env(), expected_thresholds)
@@ -175,118 +180,163 @@ class TestGetThresholdsFromEnv(unittest.TestCase):
 
 
 class TestGetGithubRepo(unittest.TestCase):
+    def setUp(self):
+        # get_github_repo is handed the client, so a plain Mock is enough
+        self.github = Mock()
+
     @patch.dict(os.environ, {"GITHUB_REPOSITORY": "test_org/test_repo"})
-    @patch("check_alerts.Github")
-    def test_get_github_repo_success(self, mock_github):
+    def test_get_github_repo_success(self):
         mock_repo = Mock()
         mock_repo.full_name = "test_org/test_repo"
-        mock_github.get_repo.return_value = mock_repo
+        self.github.get_repo.return_value = mock_repo
 
-        repo = get_github_repo(mock_github)
+        repo = get_github_repo(self.github)
 
         self.assertEqual(repo.full_name, "test_org/test_repo")
+        self.github.get_repo.assert_called_once_with("test_org/test_repo")
 
-    @patch("check_alerts.os.getenv")
-    @patch("check_alerts.sys.exit")
-    def test_get_github_repo_no_repo_name(self, mock_exit, mock_getenv):
-        mock_getenv.return_value = None
-        mock_github = MagicMock()
-
-        get_github_repo(mock_github)
-
-        mock_exit.assert_called_once_with(1)
+    @patch.dict(os.environ, {}, clear=True)
+    def test_get_github_repo_no_repo_name(self):
+        with self.assertRaises(SystemExit) as cm:
+            get_github_repo(self.github)
+        self.assertEqual(cm.exception.code, 1)
+        self.github.get_repo.assert_not_called()
 
     @patch.dict(os.environ, {"GITHUB_REPOSITORY": "test_org/test_repo"})
-    @patch("check_alerts.Github")
-    def test_get_github_repo_github_exception(self, mock_github):
-        mock_github.get_repo.side_effect = GithubException(404, "Repo not found")
+    def test_get_github_repo_github_exception(self):
+        self.github.get_repo.side_effect = GithubException(404, "Repo not found")
 
         with self.assertRaises(GithubException):
-            get_github_repo(mock_github)
+            get_github_repo(self.github)
+
+def make_alerts_page(nodes, end_cursor=None):
+    return (
+        {},
+        {
+            "data": {
+                "repository": {
+                    "vulnerabilityAlerts": {
+                        "pageInfo": {"hasNextPage": end_cursor is not None, "endCursor": end_cursor},
+                        "nodes": nodes,
+                    }
+                }
+            }
+        },
+    )
 
 class TestGetDependabotAlerts(unittest.TestCase):
     def setUp(self):
         self.repo = Mock()
+        self.repo.full_name = "test_org/test_repo"
+        self.repo.html_url = "https://github.com/test_org/test_repo"
+        self.requester = self.repo.requester
 
     def test_get_dependabot_alerts_success(self):
-        mock_alerts = ["alert1", "alert2"]
-        self.repo.get_dependabot_alerts.return_value = mock_alerts
+        self.requester.graphql_query.return_value = make_alerts_page([{"number": 1}, {"number": 2}])
+
+        alerts = get_dependabot_alerts(self.repo)
+        self.assertEqual(
+            alerts,
+            [
+                {"number": 1, "url": "https://github.com/test_org/test_repo/security/dependabot/1"},
+                {"number": 2, "url": "https://github.com/test_org/test_repo/security/dependabot/2"},
+            ],
+        )
+        self.requester.graphql_query.assert_called_once_with(
+            ALERTS_QUERY, {"owner": "test_org", "name": "test_repo", "after": None}
+        )
+
+    def test_get_dependabot_alerts_multiple_pages(self):
+        variables_seen = []
+        pages = iter([
+            make_alerts_page([{"number": 1}], end_cursor="abc"),
+            make_alerts_page([{"number": 2}]),
+        ])
+
+        def graphql_query(query, variables):
+            variables_seen.append(dict(variables))
+            return next(pages)
+
+        self.requester.graphql_query.side_effect = graphql_query
 
         alerts = get_dependabot_alerts(self.repo)
-        self.assertEqual(alerts, mock_alerts)
-        self.repo.get_dependabot_alerts.assert_called_once()
+        self.assertEqual([alert["number"] for alert in alerts], [1, 2])
+        self.assertEqual([variables["after"] for variables in variables_seen], [None, "abc"])
 
     def test_get_dependabot_alerts_github_exception(self):
-        self.repo.get_dependabot_alerts.side_effect = GithubException(403, {"message": "Forbidden"})
+        self.requester.graphql_query.side_effect = GithubException(403, {"message": "Forbidden"})
+
+        with self.assertRaises(SystemExit) as cm:
+            get_dependabot_alerts(self.repo)
+        self.assertEqual(cm.exception.code, 1)
+        self.requester.graphql_query.assert_called_once()
+
+    def test_get_dependabot_alerts_graphql_forbidden(self):
+        self.requester.graphql_query.side_effect = GithubException(
+            400,
+            {"errors": [{"type": "FORBIDDEN", "message": "Resource not accessible by integration"}]},
+        )
 
         with self.assertRaises(SystemExit) as cm:
             get_dependabot_alerts(self.repo)
         self.assertEqual(cm.exception.code, 1)
-        self.repo.get_dependabot_alerts.assert_called_once()
 
     def test_get_dependabot_alerts_general_exception(self):
-        self.repo.get_dependabot_alerts.side_effect = Exception("General error")
+        self.requester.graphql_query.side_effect = Exception("General error")
 
         with self.assertRaises(Exception) as cm:
             get_dependabot_alerts(self.repo)
         self.assertEqual(str(cm.exception), "General error")
-        self.repo.get_dependabot_alerts.assert_called_once()
+        self.requester.graphql_query.assert_called_once()
 
-    def test_get_dependabot_alerts_disabled(self):
-        self.repo.get_dependabot_alerts.side_effect = GithubException(
-            403,
-            {
-                "message": "Dependabot alerts are disabled for this repository.",
-                "documentation_url": "https://docs.github.com/rest/dependabot/alerts#list-dependabot-alerts-for-a-repository",
-                "status": "403"
-            }
-        )
+    def test_get_dependabot_alerts_exception_without_data(self):
+        # Gateway errors such as 502 can arrive with an empty body
+        self.requester.graphql_query.side_effect = GithubException(502, None)
 
-        alerts = get_dependabot_alerts(self.repo)
-        self.assertEqual(alerts, [])
-        self.repo.get_dependabot_alerts.assert_called_once()
+        with self.assertRaises(GithubException) as cm:
+            get_dependabot_alerts(self.repo)
+        self.assertEqual(cm.exception.status, 502)
+        self.requester.graphql_query.assert_called_once()
 
 class TestAnalyzeAlerts(unittest.TestCase):
-    def setUp(self):
-        self.alerts = [
-            Mock(
-                state="open",
-                security_advisory=Mock(severity="high", summary="Test summary"),
-                created_at=datetime.now(timezone.utc) - timedelta(days=10),
-                dependency=Mock(package=Mock()),
-                html_url="http://example.com"
-            ),
-            Mock(
-                state="closed",
-                security_advisory=Mock(severity="low", summary="Test summary 2"),
-                created_at=datetime.now(timezone.utc) - timedelta(days=5),
-                dependency=Mock(package=Mock()),
-                html_url="http://example.com/2"
-            ),
-            Mock(
-                state="open",
-                security_advisory=Mock(severity="low", summary="Test summary 2"),
-                created_at=datetime.now(timezone.utc) - timedelta(days=5),
-                dependency=Mock(package=Mock()),
-                html_url="http://example.com/2"
-            )
-        ]
-        self.alert_thresholds = {
+    @classmethod
+    def setUpClass(cls):
+        cls.alert_prototypes = (
+            {
+                "number": 1,
+                "createdAt": (NOW - timedelta(days=10)).isoformat(),
+                "vulnerableManifestPath": "package-lock.json",
+                "securityVulnerability": {"severity": "HIGH", "package": {"name": "test_package"}},
+                "securityAdvisory": {"ghsaId": "GHSA-aaaa-aaaa-aaaa", "summary": "Test summary"},
+                "url": "http://example.com"
+            },
+            {
+                "number": 2,
+                "createdAt": (NOW - timedelta(days=5)).isoformat(),
+                "vulnerableManifestPath": "requirements.txt",
+                "securityVulnerability": {"severity": "LOW", "package": {"name": "test_package_2"}},
+                "securityAdvisory": {"ghsaId": "GHSA-bbbb-bbbb-bbbb", "summary": "Test summary 2"},
+                "url": "http://example.com/2"
+            },
+        )
+        cls.alert_thresholds = {
             "CRITICAL": 3,
             "HIGH": 5,
             "MEDIUM": 14,
             "LOW": 30,
         }
 
-        # Ensure the name attribute returns the correct value
-        self.alerts[0].dependency.package.name = "test_package"
-        self.alerts[1].dependency.package.name = "test_package_2"
-        self.alerts[2].dependency.package.name = "test_package_3"
+    def setUp(self):
+        patcher = patch("check_alerts._now", return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Tests only replace top level values, so a shallow copy of each alert is enough
+        self.alerts = [dict(alert) for alert in self.alert_prototypes]
 
     def test_analyze_alerts(self):
-        violations, all_alerts = analyze_alerts(self.alerts, self.alert_thresholds)
+        violations, alert_count = analyze_alerts(self.alerts, self.alert_thresholds)
 
-        self.assertEqual(len(all_alerts), 2)
+        self.assertEqual(alert_count, 2)
         self.assertEqual(len(violations), 1)
         self.assertEqual(violations[0]["package"], "test_package")
         self.assertEqual(violations[0]["severity"], "HIGH")
@@ -294,96 +344,154 @@ class TestAnalyzeAlerts(unittest.TestCase):
         self.assertEqual(violations[0]["threshold_days"], 5)
         self.assertEqual(violations[0]["url"], "http://example.com")
         self.assertEqual(violations[0]["title"], "Test summary")
+        self.assertEqual(violations[0]["manifests"], ["package-lock.json"])
+
+    def test_analyze_alerts_groups_manifests_by_advisory(self):
+        self.alerts.append(
+            {
+                "number": 3,
+                "createdAt": (NOW - timedelta(days=12)).isoformat(),
+                "vulnerableManifestPath": "app/package-lock.json",
+                "securityVulnerability": {"severity": "HIGH", "package": {"name": "test_package"}},
+                "securityAdvisory": {"ghsaId": "GHSA-aaaa-aaaa-aaaa", "summary": "Test summary"},
+                "url": "http://example.com/3"
+            }
+        )
+        violations, alert_count = analyze_alerts(self.alerts, self.alert_thresholds)
+
+        self.assertEqual(alert_count, 3)
+        self.assertEqual(len(violations), 1)
+        self.assertEqual(violations[0]["manifests"], ["package-lock.json", "app/package-lock.json"])
+        self.assertEqual(violations[0]["age_days"], 12)
+        self.assertEqual(violations[0]["url"], "http://example.com/3")
 
     def test_analyze_alerts_no_violations(self):
-        self.alerts[0].created_at = datetime.now(timezone.utc) - timedelta(days=3)
-        violations, all_alerts = analyze_alerts(self.alerts, self.alert_thresholds)
+        self.alerts[0]["createdAt"] = (NOW - timedelta(days=3)).isoformat()
+        violations, alert_count = analyze_alerts(self.alerts, self.alert_thresholds)
 
-        self.assertEqual(len(all_alerts), 2)
+        self.assertEqual(alert_count, 2)
         self.assertEqual(len(violations), 0)
 
-    def test_analyze_alerts_all_closed(self):
-        self.alerts[0].state = "closed"
-        self.alerts[2].state = "closed"
-        violations, all_alerts = analyze_alerts(self.alerts, self.alert_thresholds)
+    def test_analyze_alerts_moderate_severity(self):
+        self.alerts[1]["securityVulnerability"] = dict(self.alerts[1]["securityVulnerability"], severity="MODERATE")
+        self.alerts[1]["createdAt"] = (NOW - timedelta(days=15)).isoformat()
+        violations, alert_count = analyze_alerts(self.alerts, self.alert_thresholds)
 
-        self.assertEqual(len(all_alerts), 0)
+        self.assertEqual(violations[1]["severity"], "MEDIUM")
+        self.assertEqual(violations[1]["threshold_days"], 14)
+
+    def test_analyze_alerts_created_at_format(self):
+        self.alerts[0]["createdAt"] = "2025-02-01T12:00:00Z"
+        violations, alert_count = analyze_alerts(self.alerts, self.alert_thresholds)
+
+        self.assertEqual(violations[0]["created_at"], "2025-02-01 12:00:00 UTC")
+
+    def test_analyze_alerts_created_at_fractional_seconds(self):
+        self.alerts[0]["createdAt"] = "2025-02-01T12:00:00.123456Z"
+        violations, alert_count = analyze_alerts(self.alerts, self.alert_thresholds)
+
+        self.assertEqual(violations[0]["created_at"], "2025-02-01 12:00:00 UTC")
+
+    def test_analyze_alerts_no_alerts(self):
+        violations, alert_count = analyze_alerts([], self.alert_thresholds)
+
+        self.assertEqual(alert_count, 0)
         self.assertEqual(len(violations), 0)
 
+EXPECTED_VIOLATIONS_PREFIX = (
+    "## Dependabot Alert Summary\n"
+    "Total open alerts: 2\n"
+    "Alerts exceeding age threshold: 1\n"
+    "\n### :x: Violations (Alerts exceeding threshold)\n"
+    "\n\n#### \n"
+    "- **Severity:** HIGH\n"
+    "- **Age:** 10 days (Threshold: 5 days)\n"
+    "- **Created:** 2025-02-01 12:00:00 UTC\n"
+    "- **URL:** http://example.com\n"
+    "- **Manifests:**\n"
+    "  - package-lock.json\n"
+)
+EXPECTED_WITH_VIOLATIONS = (
+    EXPECTED_VIOLATIONS_PREFIX
+    + "\n:no_entry: Action failed due to alerts exceeding age thresholds"
+)
+EXPECTED_WITH_VIOLATIONS_REPORT_MODE = (
+    EXPECTED_VIOLATIONS_PREFIX
+    + "\n:warning: Alerts exceed age thresholds but running in report mode"
+)
+
 class TestFormatAlertOutput(unittest.TestCase):
-    def setUp(self):
-        self.violations = [
-            {
-                "package": "test_package",
-                "severity": "HIGH",
-                "age_days": 10,
-                "threshold_days": 5,
-                "url": "http://example.com",
-                "title": "Test summary",
-                "created_at": "2025-02-01 12:00:00 UTC"
-            }
-        ]
-        self.all_alerts = [
-            {
-                "package": "test_package",
-                "severity": "HIGH",
-                "age_days": 10,
-                "threshold_days": 5,
-                "url": "http://example.com",
-                "title": "Test summary",
-                "created_at": "2025-02-01 12:00:00 UTC"
-            },
+    # Not modified by any test, so shared rather than rebuilt per test
+    violations = [
+        {
+            "package": "test_package",
+            "severity": "HIGH",
+            "age_days": 10,
+            "threshold_days": 5,
+            "url": "http://example.com",
+            "title": "Test summary",
+            "created_at": "2025-02-01 12:00:00 UTC",
+            "manifests": ["package-lock.json"]
+        }
+    ]
+    alert_count = 2
+
+    def test_format_alert_output_with_violations(self):
+        report_mode = False
+        output = format_alert_output(self.violations, self.alert_count, report_mode)
+        self.assertEqual(output, EXPECTED_WITH_VIOLATIONS)
+
+    def test_format_alert_output_with_violations_report_mode(self):
+        report_mode = True
+        output = format_alert_output(self.violations, self.alert_count, report_mode)
+        self.assertEqual(output, EXPECTED_WITH_VIOLATIONS_REPORT_MODE)
+
+    def test_format_alert_output_multiple_violations(self):
+        violations = self.violations + [
             {
                 "package": "test_package_2",
                 "severity": "LOW",
-                "age_days": 3,
+                "age_days": 31,
                 "threshold_days": 30,
                 "url": "http://example.com/2",
                 "title": "Test summary 2",
-                "created_at": "2025-02-07 12:00:00 UTC"
+                "created_at": "2025-02-07 12:00:00 UTC",
+                "manifests": ["requirements.txt", "docs/requirements.txt"]
             }
         ]
-
-    def test_format_alert_output_with_violations(self):
-        report_mode = False
-        output = format_alert_output(self.violations, self.all_alerts, report_mode)
-        expected_output = (
-            "## Dependabot Alert Summary\n"
-            "Total open alerts: 2\n"
-            "Alerts exceeding age threshold: 1\n"
-            "\n### :x: Violations (Alerts exceeding threshold)\n"
-            "\n\n#### \n"
-            "- **Severity:** HIGH\n"
-            "- **Age:** 10 days (Threshold: 5 days)\n"
-            "- **Created:** 2025-02-01 12:00:00 UTC\n"
+        output = format_alert_output(violations, self.alert_count, False)
+        self.assertIn(
             "- **URL:** http://example.com\n"
-            "\n:no_entry: Action failed due to alerts exceeding age thresholds"
+            "- **Manifests:**\n"
+            "  - package-lock.json\n"
+            "\n\n#### \n"
+            "- **Severity:** LOW\n"
+            "- **Age:** 31 days (Threshold: 30 days)\n"
+            "- **Created:** 2025-02-07 12:00:00 UTC\n"
+            "- **URL:** http://example.com/2\n"
+            "- **Manifests:**\n"
+            "  - requirements.txt\n"
+            "  - docs/requirements.txt\n",
+            output,
         )
-        self.assertEqual(output, expected_output)
+        self.assertIn("Alerts exceeding age threshold: 3\n", output)
 
-    def test_format_alert_output_with_violations_report_mode(self):
-        report_mode = True
-        output = format_alert_output(self.violations, self.all_alerts, report_mode)
+    def test_format_alert_output_no_violations(self):
+        report_mode = False
+        output = format_alert_output([], self.alert_count, report_mode)
         expected_output = (
             "## Dependabot Alert Summary\n"
             "Total open alerts: 2\n"
-            "Alerts exceeding age threshold: 1\n"
-            "\n### :x: Violations (Alerts exceeding threshold)\n"
-            "\n\n#### \n"
-            "- **Severity:** HIGH\n"
-            "- **Age:** 10 days (Threshold: 5 days)\n"
-            "- **Created:** 2025-02-01 12:00:00 UTC\n"
-            "- **URL:** http://example.com\n"
-            "\n:warning: Alerts exceed age thresholds but running in report mode"
+            "Alerts exceeding age threshold: 0\n"
+            "\n:white_check_mark: All alerts are within acceptable age thresholds"
         )
         self.assertEqual(output, expected_output)
 
-    def test_format_alert_output_no_violations(self):
-        report_mode = False
-        output = format_alert_output([], self.all_alerts, report_mode)
+    def test_format_alert_output_no_alerts(self):
+        output = format_alert_output([], 0, False)
         expected_output = (
             "## Dependabot Alert Summary\n"
-            "Total open alerts: 2\n"
+            "Total open alerts: 0\n"
             "Alerts exceeding age threshold: 0\n"
             "\n:white_check_mark: All alerts are within acceptable age thresholds"
         )
@@ -424,10 +532,8 @@ class TestRevokeInstallationToken(unittest.TestCase):
         mock_github = MagicMock()
         mock_requester = MagicMock()
         mock_github.requester = mock_requester
-        mock_requester.requestJsonAndCheck.return_value = (
-            "headers",
-            json.dumps({"Status": 204}),
-        )
+        # 204 No Content: PyGithub returns the headers and no parsed body
+        mock_requester.requestJsonAndCheck.return_value = ({}, None)
 
         revoke_installation_token(mock_github)
 
@@ -450,119 +556,76 @@ class TestRevokeInstallationToken(unittest.TestCase):
         mock_exit.assert_called_once_with(1)
 
 class TestGetEnvVariable(unittest.TestCase):
-    @patch('check_alerts.os.getenv')
-    def test_get_env_variable_success(self, mock_getenv):
-        mock_getenv.return_value = "test_value"
+    @patch.dict(os.environ, {"TEST_ENV_VAR": "test_value"}, clear=True)
+    def test_get_env_variable_success(self):
         result = get_env_variable("TEST_ENV_VAR")
         self.assertEqual(result, "test_value")
-        mock_getenv.assert_called_once_with("TEST_ENV_VAR", None)
 
-    @patch('check_alerts.os.getenv')
-    def test_get_env_variable_with_default(self, mock_getenv):
-        mock_getenv.return_value = "default_value"
+    @patch.dict(os.environ, {}, clear=True)
+    def test_get_env_variable_with_default(self):
         result = get_env_variable("TEST_ENV_VAR", "default_value")
         self.assertEqual(result, "default_value")
-        mock_getenv.assert_called_once_with("TEST_ENV_VAR", "default_value")
 
-    @patch('check_alerts.os.getenv')
-    def test_get_env_variable_not_found(self, mock_getenv):
-        mock_getenv.return_value = None
+    @patch.dict(os.environ, {"TEST_ENV_VAR": "test_value"}, clear=True)
+    def test_get_env_variable_set_overrides_default(self):
+        result = get_env_variable("TEST_ENV_VAR", "default_value")
+        self.assertEqual(result, "test_value")
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_get_env_variable_not_found(self):
         with self.assertRaises(SystemExit) as cm:
             get_env_variable("TEST_ENV_VAR")
         self.assertEqual(cm.exception.code, 1)
-        mock_getenv.assert_called_once_with("TEST_ENV_VAR", None)
 
 class TestMainCheckAlerts(unittest.TestCase):
-    @patch('check_alerts.get_dependabot_alerts')
-    @patch('check_alerts.analyze_alerts')
-    @patch('check_alerts.format_alert_output')
-    @patch('check_alerts.read_event_file')
-    @patch('check_alerts.get_pr_number')
-    @patch('check_alerts.post_pr_comment')
-    @patch('check_alerts.revoke_installation_token')
-    def test_main_check_alerts_success(
-        self, mock_revoke_installation_token, mock_post_pr_comment, mock_get_pr_number, mock_read_event_file,
-        mock_format_alert_output, mock_analyze_alerts, mock_get_dependabot_alerts
-    ):
-        github = Mock()
-        repo = Mock()
-        alert_thresholds = {"HIGH": 5}
-        report_mode = False
-        event_name = "pull_request"
-        event_path = "test_event_path"
+    def setUp(self):
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        self.mock_get_dependabot_alerts = stack.enter_context(patch('check_alerts.get_dependabot_alerts'))
+        self.mock_analyze_alerts = stack.enter_context(patch('check_alerts.analyze_alerts'))
+        self.mock_format_alert_output = stack.enter_context(patch('check_alerts.format_alert_output'))
+        self.mock_read_event_file = stack.enter_context(patch('check_alerts.read_event_file'))
+        self.mock_get_pr_number = stack.enter_context(patch('check_alerts.get_pr_number'))
+        self.mock_post_pr_comment = stack.enter_context(patch('check_alerts.post_pr_comment'))
+        self.mock_revoke_installation_token = stack.enter_context(patch('check_alerts.revoke_installation_token'))
+
+        self.github = Mock()
+        self.repo = Mock()
+        self.alert_thresholds = {"HIGH": 5}
+        self.event_name = "pull_request"
+        self.event_path = "test_event_path"
+
+        self.mock_get_dependabot_alerts.return_value = []
+        self.mock_format_alert_output.return_value = "Test output"
+        self.mock_read_event_file.return_value = {}
+        self.mock_get_pr_number.return_value = 123
+
+    def run_main_check_alerts(self, report_mode):
+        main_check_alerts(
+            self.github, self.repo, self.alert_thresholds, report_mode, self.event_name, self.event_path
+        )
 
-        mock_get_dependabot_alerts.return_value = []
-        mock_analyze_alerts.return_value = ([], [])
-        mock_format_alert_output.return_value = "Test output"
-        mock_read_event_file.return_value = {}
-        mock_get_pr_number.return_value = 123
+    def test_main_check_alerts_success(self):
+        self.mock_analyze_alerts.return_value = ([], 0)
 
         with patch('sys.exit') as mock_exit:
-            main_check_alerts(
-                github, repo, alert_thresholds, report_mode, event_name, event_path
-            )
+            self.run_main_check_alerts(report_mode=False)
             mock_exit.assert_called_once_with(0)
 
-    @patch('check_alerts.get_dependabot_alerts')
-    @patch('check_alerts.analyze_alerts')
-    @patch('check_alerts.format_alert_output')
-    @patch('check_alerts.read_event_file')
-    @patch('check_alerts.get_pr_number')
-    @patch('check_alerts.post_pr_comment')
-    @patch('check_alerts.revoke_installation_token')
-    def test_main_check_alerts_with_violations(
-        self, mock_revoke_installation_token, mock_post_pr_comment, mock_get_pr_number, mock_read_event_file,
-        mock_format_alert_output, mock_analyze_alerts, mock_get_dependabot_alerts
-    ):
-        github = Mock()
-        repo = Mock()
-        alert_thresholds = {"HIGH": 5}
-        report_mode = False
-        event_name = "pull_request"
-        event_path = "test_event_path"
-
-        mock_get_dependabot_alerts.return_value = []
-        mock_analyze_alerts.return_value = ([{"severity": "HIGH"}], [])
-        mock_format_alert_output.return_value = "Test output"
-        mock_read_event_file.return_value = {}
-        mock_get_pr_number.return_value = 123
+    def test_main_check_alerts_with_violations(self):
+        self.mock_analyze_alerts.return_value = ([{"severity": "HIGH"}], 1)
 
         with patch('sys.exit') as mock_exit:
-            main_check_alerts(
-                github, repo, alert_thresholds, report_mode, event_name, event_path
-            )
+            self.run_main_check_alerts(report_mode=False)
             # we have mocked the sys.exit,
             #  so the flow results in exit called with 1,
             #  and *then* exit called with 0
             mock_exit.assert_any_call(1)
             mock_exit.assert_called_with(0)
 
-    @patch('check_alerts.get_dependabot_alerts')
-    @patch('check_alerts.analyze_alerts')
-    @patch('check_alerts.format_alert_output')
-    @patch('check_alerts.read_event_file')
-    @patch('check_alerts.get_pr_number')
-    @patch('check_alerts.post_pr_comment')
-    @patch('check_alerts.revoke_installation_token')
-    def test_main_check_alerts_report_mode(
-        self, mock_revoke_installation_token, mock_post_pr_comment, mock_get_pr_number, mock_read_event_file,
-        mock_format_alert_output, mock_analyze_alerts, mock_get_dependabot_alerts
-    ):
-        github = Mock()
-        repo = Mock()
-        alert_thresholds = {"HIGH": 5}
-        report_mode = True
-        event_name = "pull_request"
-        event_path = "test_event_path"
-
-        mock_get_dependabot_alerts.return_value = []
-        mock_analyze_alerts.return_value = ([{"severity": "HIGH"}], [])
-        mock_format_alert_output.return_value = "Test output"
-        mock_read_event_file.return_value = {}
-        mock_get_pr_number.return_value = 123
+    def test_main_check_alerts_report_mode(self):
+        self.mock_analyze_alerts.return_value = ([{"severity": "HIGH"}], 1)
 
         with patch('sys.exit') as mock_exit:
-            main_check_alerts(
-                github, repo, alert_thresholds, report_mode, event_name, event_path
-            )
+            self.run_main_check_alerts(report_mode=True)
             mock_exit.assert_called_once_with(0)